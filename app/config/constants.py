@@ -6,9 +6,27 @@ WEBDRIVER_WAIT_TIMEOUT: dict = {
     'long': 60
 }
 
+# Website URLs.
+INTERCOMMERCE_LOGIN_URL: str = 'https://www.intercommerce.com.ph/'
+VBS_LOGIN_URL: str = 'https://ictsi.vbs.1-stop.biz'
+ATIMNL_ACCEPT_URL: str = 'https://atimnl.vbs.1-stop.biz/Default.aspx?vbs_Facility_Changed=true&vbs_new_selected_FACILITYID=ATIMNL'
+ATIMNL_TXN_URL: str = 'https://atimnl.vbs.1-stop.biz/PointsTransactions.aspx'
+ICTSI_ACCEPT_URL: str = 'https://ictsi.vbs.1-stop.biz/Default.aspx?vbs_Facility_Changed=true&vbs_new_selected_FACILITYID=ICTSI'
+ICTSI_TXN_URL: str = 'https://ictsi.vbs.1-stop.biz/PointsTransactions.aspx'
+
 # Downloading specific settings.
 DRIVER_DOWNLOAD_TIMEOUT: int = 120
-DRIVER_DOWNLOAD_POLL_INTERVAL: int = 1
+DRIVER_DOWNLOAD_POLL_INTERVAL: float = 0.2
+# Polling starts with a short interval that grows up to the poll interval,
+# so quick downloads are noticed quickly without polling slow ones often.
+DRIVER_DOWNLOAD_INITIAL_POLL_INTERVAL: float = 0.02
+
+# How long (in seconds) the result of a directory existence check is reused.
+DIRECTORY_EXISTS_TTL: float = 1.0
+
+# Run Chrome with the new headless mode, which renders like the regular
+# browser but without a window. Set to False to watch the scrapers work.
+DRIVER_HEADLESS: bool = True
 
 # Maximum number of login attempts before closing the browser.
 MAX_LOGIN_ATTEMPTS: int = 3
@@ -16,6 +34,39 @@ MAX_LOGIN_ATTEMPTS: int = 3
 # Timeout in milliseconds after max attempts are reached.
 LOGIN_ATTEMPT_TIMEOUT: int = 500
 
+# Timeouts (in seconds) and retries for documents fetched over HTTP
+# outside of the browser, so that a stalled request cannot block a crawl.
+HTTP_CONNECT_TIMEOUT: float = 5.0
+HTTP_READ_TIMEOUT: float = 30.0
+HTTP_RETRIES: int = 3
+
+# How long (in seconds) authentication results are remembered. Failed
+# logins are kept briefly so retries still reach the website quickly.
+AUTH_CACHE_TTL: int = 300
+AUTH_CACHE_FAILURE_TTL: int = 10
+AUTH_CACHE_MAX_SIZE: int = 128
+
+# Number of newly cached rows that are buffered before they are added to
+# the in-memory rows frame in a single batch.
+ROW_BUFFER_SIZE: int = 100
+
+# Scripts for reading the text of every cell of a row or table in a
+# single WebDriver round-trip instead of one request per cell.
+ROW_CELLS_TEXT_SCRIPT: str = 'return Array.from(arguments[0].children, (cell) => cell.innerText.trim());'
+TABLE_CELLS_TEXT_SCRIPT: str = "return Array.from(arguments[0].querySelectorAll('td'), (cell) => cell.innerText.trim());"
+
+# Script for filling in the (read-only) date range of the VBS transactions
+# search form in a single WebDriver round-trip.
+SET_DATE_RANGE_SCRIPT: str = """
+for (const [id, value] of [['PointsTransactionsSearchForm___DATEFROM', arguments[0]],
+                           ['PointsTransactionsSearchForm___DATETO', arguments[1]]]) {
+    const field = document.getElementById(id);
+    field.removeAttribute('readonly');
+    field.value = value;
+    field.dispatchEvent(new Event('change', { bubbles: true }));
+}
+"""
+
 
 # The base directory of the project.
 BASE_DIR = str(Path().resolve())
@@ -1,11 +1,24 @@
+import re
 import logging
 from app.utils.colors import Color
 
+# Values in square brackets, e.g. "[ABC123]", that are not colored yet.
+_BRACKETED = re.compile(r'(?<!\x1b)\[([^\[\]\x1b]+)\]')
+
 class ConsoleFormatter(logging.Formatter):
     """
     Custom formatter to add colors to the log levels in the console.
+    Values in square brackets in the message are colored as well, so that
+    callers can log them lazily with "[%s]" instead of colorizing them.
     """
 
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        record.message = _BRACKETED.sub(
+            lambda match: f'[{Color.colorize(match.group(1), Color.CYAN)}]',
+            record.message
+        )
+        return super().formatMessage(record)
+
     def format(self, record: logging.LogRecord) -> logging.Formatter:
         # Map log levels to colors.
         level_colors = {
@@ -5,23 +5,45 @@ import polars as pl
 from polars import Series, DataFrame
 
 from app.config.logger import setup_logger
-from app.config.constants import DOC_DIR
+from app.utils.directory import get_cache_dir
 from app.utils.colors import Color
-from app.utils.directory import check_file
 from app.utils.exceptions import InvalidDocumentException
 
 logger = setup_logger(__name__)
 
-def load_csv_file(filename: str, save_dir: str) -> DataFrame:
+def load_csv_file(filename: str, save_dir: str, infer_schema: bool = True) -> Optional[DataFrame]:
     """
     Loads a CSV file from the specified directory.
 
     Parameters:
         filename (str): The name of the CSV file to load.
         directory (str): The directory where the CSV file is located.
+        infer_schema (bool): Whether to guess the column types. If False, every column is read as a string.
 
     Returns:
-        DataFrame: A Polars DataFrame containing the data from the CSV file.
+        DataFrame: A Polars DataFrame containing the data from the CSV file,
+                   or None if the file does not exist.
     """
-    if check_file(filename, 'documents', save_dir, 'cache'):
-        return pl.read_csv(path.join(DOC_DIR, save_dir, 'cache', filename))
\ No newline at end of file
+    # Read the file directly instead of checking that it exists first.
+    try:
+        return pl.read_csv(path.join(get_cache_dir(save_dir), filename), infer_schema=infer_schema)
+    except FileNotFoundError:
+        return None
+
+def load_parquet_file(filename: str, save_dir: str) -> Optional[DataFrame]:
+    """
+    Loads a Parquet file from the specified directory.
+
+    Parameters:
+        filename (str): The name of the Parquet file to load.
+        directory (str): The directory where the Parquet file is located.
+
+    Returns:
+        DataFrame: A Polars DataFrame containing the data from the Parquet file,
+                   or None if the file does not exist.
+    """
+    # Read the file directly instead of checking that it exists first.
+    try:
+        return pl.read_parquet(path.join(get_cache_dir(save_dir), filename))
+    except FileNotFoundError:
+        return None
\ No newline at end of file
@@ -0,0 +1,145 @@
+import os
+from os import path, cpu_count, unlink
+from typing import BinaryIO, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+
+from PyPDF2 import PdfReader
+
+from app.config.constants import DATA_DIR
+
+# pypdfium2 is optional (the "fast" extra). It extracts text with PDFium
+# (C++), which is much faster than PyPDF2's pure Python parser. PyPDF2 is
+# used when it is missing.
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
+# posix_fadvise is not available on Windows.
+_FADVISE = hasattr(os, 'posix_fadvise')
+
+_CONTAINER_LABEL = 'Container No'
+_CONTAINER_HEADER = '- Container No(s) -'
+
+def _find_container_number(text: str) -> Optional[str]:
+    """
+    Finds the container number in the text of a document page.
+    The text is scanned with str.find, so it is not split into lines.
+
+    Parameters:
+        text (str): The text of the page.
+
+    Returns:
+        Optional[str]: The container number, or None if the text has none.
+    """
+    start = 0
+    while (index := text.find(_CONTAINER_LABEL, start)) != -1:
+        # Skip the "- Container No(s) -" section header.
+        if index >= 2 and text.startswith(_CONTAINER_HEADER, index - 2):
+            start = index - 2 + len(_CONTAINER_HEADER)
+            continue
+
+        end = text.find('\n', index)
+        return text[index:end if end != -1 else None].rsplit(' ', 1)[1].strip()
+
+    return None
+
+def _read_first_page_pdfium(stream: BinaryIO) -> str:
+    """
+    Reads the text of the first page of a PDF with PDFium.
+
+    Parameters:
+        stream (BinaryIO): The PDF file or an in-memory buffer of it.
+
+    Returns:
+        str: The text of the first page.
+    """
+    pdf = pdfium.PdfDocument(stream)
+    try:
+        page = pdf[0]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+
+def read_container_number(stream: BinaryIO) -> Optional[str]:
+    """
+    Reads the container number from the first page of a document PDF.
+
+    Parameters:
+        stream (BinaryIO): The PDF file or an in-memory buffer of it.
+
+    Returns:
+        Optional[str]: The container number, or None if the page has none.
+    """
+    if pdfium is not None:
+        return _find_container_number(_read_first_page_pdfium(stream))
+
+    reader = PdfReader(stream, strict=False)
+    return _find_container_number(reader.pages[0].extract_text())
+
+def extract_container_number(filename: str) -> Optional[str]:
+    """
+    Extracts the container number from a downloaded PDF file.
+
+    Parameters:
+        filename (str): The name of the PDF file in the data directory.
+
+    Returns:
+        Optional[str]: The container number, or None if the page has none.
+    """
+    with open(path.join(DATA_DIR, filename), 'rb') as pdf:
+        # PDFs are read from the end (the cross-reference table) first, so
+        # ask the kernel to read the whole file ahead instead of sequentially.
+        if _FADVISE:
+            os.posix_fadvise(pdf.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        return read_container_number(pdf)
+
+def destroy_pdf(filename: str) -> None:
+    """
+    Deletes a downloaded PDF file. A file that is already gone is ignored.
+
+    Parameters:
+        filename (str): The name of the PDF file in the data directory.
+    """
+    try:
+        unlink(path.join(DATA_DIR, filename))
+    except FileNotFoundError:
+        pass
+
+def extract_and_destroy(filename: str) -> Optional[str]:
+    """
+    Extracts the container number from a downloaded PDF file and deletes
+    the file afterwards, even if the extraction fails.
+
+    Parameters:
+        filename (str): The name of the PDF file in the data directory.
+
+    Returns:
+        Optional[str]: The container number, or None if the page has none.
+    """
+    try:
+        return extract_container_number(filename)
+    finally:
+        destroy_pdf(filename)
+
+def extract_container_numbers(filenames: List[str]) -> List[Optional[str]]:
+    """
+    Extracts the container numbers from several downloaded PDF files.
+    Parsing is CPU bound, so the files are spread over worker processes.
+
+    Parameters:
+        filenames (List[str]): The names of the PDF files in the data directory.
+
+    Returns:
+        List[Optional[str]]: The container numbers, in the order of the files.
+    """
+    if len(filenames) <= 1:
+        return [extract_container_number(filename) for filename in filenames]
+
+    with ProcessPoolExecutor(max_workers=min(len(filenames), cpu_count() or 1)) as executor:
+        return list(executor.map(extract_container_number, filenames, chunksize=4))
@@ -1,3 +1,4 @@
+from enum import IntEnum
 from datetime import datetime, timedelta, date
 from pydantic import BaseModel, SecretStr, ValidationInfo, field_validator
 
@@ -79,4 +80,11 @@ class DataFrameModel(BaseModel):
     document_status: str
     release_status: str
 
-    checked_date: datetime = None
\ No newline at end of file
+    checked_date: datetime = None
+
+class ScrapeOutcome(IntEnum):
+    """Result of caching or checking a row, for outcomes that are not errors."""
+    OK = 0
+    CACHED = 1
+    ALREADY_SCRAPED = 2
+    INVALID = 3
@@ -1,42 +1,74 @@
-from typing import Tuple
+from typing import Optional, Tuple
 
 from selenium.webdriver import Chrome, ChromeOptions
 from selenium.webdriver.support.ui import WebDriverWait
 
-from app.config.constants import WEBDRIVER_WAIT_TIMEOUT, DATA_DIR
+from app.config.constants import WEBDRIVER_WAIT_TIMEOUT, DATA_DIR, DRIVER_HEADLESS
 from app.config.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Chrome arguments and preferences shared by every driver. Images and
+# extensions are disabled since the scrapers only read the page's text.
+_DEFAULT_ARGUMENTS = (
+    '--enable-chrome-browser-cloud-management',
+    '--disable-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-extensions',
+    '--blink-settings=imagesEnabled=false'
+)
+_DEFAULT_PREFS = {
+    'download.prompt_for_download': False,
+    'download.directory_upgrade': True,
+    'plugin.always_open_pdf_externally': True,
+    'profile.managed_default_content_settings.images': 2
+}
+
 class Driver:
     """Context manager for managing the Chrome WebDriver."""
 
-    def __init__(self, wait=WEBDRIVER_WAIT_TIMEOUT['short'], download_dir=DATA_DIR) -> None:
+    def __init__(self, wait=WEBDRIVER_WAIT_TIMEOUT['short'], download_dir=DATA_DIR,
+                 user_data_dir: Optional[str] = None, headless: bool = DRIVER_HEADLESS) -> None:
         self.wait_timeout = wait
         self.download_dir = download_dir
+        self.user_data_dir = user_data_dir
+        self.headless = headless
 
     def __enter__(self) -> Tuple[Chrome, WebDriverWait]:
         # Setup the Chrome options.
         options = ChromeOptions()
 
         # Add headless mode option for background operations.
-        # options.add_argument("--headless") # Uncomment for headless mode
+        if self.headless:
+            options.add_argument('--headless=new')
 
-        options.add_argument('--enable-chrome-browser-cloud-management')
-        options.add_argument('--disable-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
+        for argument in _DEFAULT_ARGUMENTS:
+            options.add_argument(argument)
+        # Use a separate profile when several browsers run at the same time.
+        if self.user_data_dir is not None:
+            options.add_argument(f'--user-data-dir={self.user_data_dir}')
         options.page_load_strategy = 'normal'
         options.add_experimental_option('prefs', {
-            'download.default_directory': self.download_dir,
-            'download.prompt_for_download': False,
-            'download.directory_upgrade': True,
-            'plugin.always_open_pdf_externally': True
+            **_DEFAULT_PREFS,
+            'download.default_directory': self.download_dir
         })
 
         # Initialize the Chrome driver with the options.
         self.driver = Chrome(options=options)
         self.wait = WebDriverWait(self.driver, self.wait_timeout)
 
+        # Set the download directory through the DevTools protocol as well
+        # since headless Chrome ignores the download preferences. __exit__ is
+        # not called when __enter__ raises, so quit the browser here.
+        try:
+            self.driver.execute_cdp_cmd('Browser.setDownloadBehavior', {
+                'behavior': 'allow',
+                'downloadPath': self.download_dir
+            })
+        except Exception:
+            self.driver.quit()
+            raise
+
         return self.driver, self.wait
 
     def __exit__(self, exc_type, exc_val, traceback) -> None:
@@ -3,7 +3,6 @@ from typing import Optional
 
 import polars as pl
 from polars import Series
-from PyPDF2 import PdfReader
 from selenium.webdriver import Chrome
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
@@ -12,10 +11,17 @@ from selenium.webdriver.support import expected_conditions as EC
 
 from app.utils.colors import Color
 from app.config.settings import Settings
-from config.constants import DATA_DIR
+from app.config.constants import (
+    INTERCOMMERCE_LOGIN_URL,
+    ROW_CELLS_TEXT_SCRIPT,
+    TABLE_CELLS_TEXT_SCRIPT
+)
 from app.config.logger import setup_logger
+from app.data_processing.pdf import extract_and_destroy
 from app.utils.cache.row_cache import (
+    ROWS_CACHE_FILE,
     cache_row,
+    flush_row_cache,
     remove_row_from_csv,
     get_reference_numbers,
     check_scraped
@@ -28,13 +34,13 @@ from app.models.scraper import (
     Account,
     Dates,
     Row,
-    Document
+    Document,
+    ScrapeOutcome
 )
 from app.utils.exceptions import (
     LoginFailedException,
     LoadingFailedException,
-    InvalidDocumentException,
-    CachedException
+    InvalidDocumentException
 )
 
 logger = setup_logger(__name__)
@@ -42,7 +48,7 @@ logger = setup_logger(__name__)
 class IntercommerceScraper:
 
     def __init__(self):
-        self.url = 'https://www.intercommerce.com.ph/'
+        self.url = INTERCOMMERCE_LOGIN_URL
 
     def _verify_login(self, driver: Chrome, wait: WebDriverWait) -> bool:
         """
@@ -59,7 +65,7 @@ class IntercommerceScraper:
         try:
             wait.until(EC.presence_of_element_located((By.NAME, 'frmCreate')))
             return False
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             return 'Incorrect Password' not in driver.page_source
 
     def _authenticate(self, account: Account, driver: Chrome, wait: WebDriverWait) -> None:
@@ -98,7 +104,7 @@ class IntercommerceScraper:
 
             logger.info('Successfully logged in to Intercommerce account.')
 
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             logger.error('Timed out. The Intercommerce login page did not load.')
             raise LoadingFailedException('Timed out. The Intercommerce login page did not load.')
 
@@ -120,7 +126,7 @@ class IntercommerceScraper:
         logger.info('Save directory initialized')
         return save_dir
 
-    def _get_row_data(self, row_id: int, wait: WebDriverWait) -> Row:
+    def _get_row_data(self, row_id: int, driver: Chrome, wait: WebDriverWait) -> Row:
         """
         Get the row data from the Intercommerce system.
         It stores the row data in a CSV file for later use.
@@ -135,8 +141,8 @@ class IntercommerceScraper:
             Row: The row data retrieved from the Intercommerce system.
         """
         row_xpath = f'/html/body/form/table/tbody/tr[9]/td[2]/table/tbody/tr/td/div/table/tbody/tr/td/table/tbody/tr[{row_id}]'
-        row = wait.until(EC.presence_of_element_located((By.XPATH, row_xpath))).find_elements(By.XPATH, './*')
-        row_data = Row.from_array([child.text for child in row])
+        row = wait.until(EC.presence_of_element_located((By.XPATH, row_xpath)))
+        row_data = Row.from_array(driver.execute_script(ROW_CELLS_TEXT_SCRIPT, row))
 
         return row_data
 
@@ -144,8 +150,8 @@ class IntercommerceScraper:
         """
         Process the rows in the Intercommerce database to check if they are valid.
         This method checks if the rows are valid based on the provided dates and status.
-        If a row is invalid, it raises an InvalidDocumentException. If the row is already cached,
-        it raises a CachedException.
+        If a row is invalid, it raises an InvalidDocumentException. Rows that are already
+        cached are skipped.
         If the row is valid, it caches the row data and returns True.
 
         Parameters:
@@ -159,7 +165,7 @@ class IntercommerceScraper:
         """
         for row_id in range(15, 25):
             try:
-                row = self._get_row_data(row_id, wait)
+                row = self._get_row_data(row_id, driver, wait)
 
                 if dates.end_date < row.creation_date or row.status != 'AG':
                     raise InvalidDocumentException('The document is not valid.')
@@ -170,7 +176,7 @@ class IntercommerceScraper:
                 # Cache the row data if it is valid.
                 cache_row([row], save_dir)
 
-            except (InvalidDocumentException, CachedException, ValueError):
+            except (InvalidDocumentException, ValueError):
                 logger.warning(f'Invalid Document. Skipping document [{Color.colorize(row.reference_number, Color.CYAN)}].')
                 continue
 
@@ -218,6 +224,10 @@ class IntercommerceScraper:
             logger.error('Timed out. The Intercommerce database page did not load.')
             raise LoadingFailedException('Timed out. The Intercommerce database page did not load.')
 
+        finally:
+            # Write the rows cached in memory to the cache file.
+            flush_row_cache(save_dir)
+
     def _handle_fcl(self, row_data: Row, document_data: Document, filename: str, driver: Chrome, wait: WebDriverWait) -> None:
         container_number = self._get_container_number_from_pdf(filename)
 
@@ -274,6 +284,7 @@ class IntercommerceScraper:
     def _get_container_number_from_pdf(self, filename: str) -> str:
         """
         Extracts the container number from the downloaded PDF file.
+        The file is deleted once it has been read.
 
         Parameters:
             filename (str): The name of the PDF file to extract the container number from.
@@ -283,38 +294,53 @@ class IntercommerceScraper:
         """
 
         if wait_for_download(filename):
-            with open(path.join(DATA_DIR, filename), 'rb') as pdf:
-                reader = PdfReader(pdf, strict=False)
-                texts = reader.pages[0].extract_text().replace('- Container No(s) -', '').split('\n')
+            return extract_and_destroy(filename)
 
-                for text in texts:
-                    if 'Container No' in text:
-                        container_number = text.rsplit(' ', 1)[1].strip()
-                        return container_number
+    def _check_document(self, reference: str, save_dir: str, driver: Chrome) -> ScrapeOutcome:
+        """
+        Opens the document page and checks if the document can be scraped.
 
-    def _process_documents(self, save_dir: str, dates: Dates, driver: Chrome, wait: WebDriverWait) -> None:
+        Parameters:
+            reference (str): The reference number of the document.
+            save_dir (str): The directory where the cached rows are stored.
+            driver (Chrome): The Selenium WebDriver instance.
 
-        for reference in get_reference_numbers('rows.csv', save_dir):
-            try:
-                url = f'{self.url}/WebCWS/cws_ip_step2PEZAEXPexpress.asp?ApplNo={reference}'
-                driver.get(url)
+        Returns:
+            ScrapeOutcome: OK if the document can be scraped, INVALID if the page could not
+                           be displayed, or ALREADY_SCRAPED if it has been scraped before.
+        """
+        url = f'{self.url}/WebCWS/cws_ip_step2PEZAEXPexpress.asp?ApplNo={reference}'
+        driver.get(url)
+
+        if 'The page cannot be displayed because an internal server error has occurred.' in driver.page_source:
+            return ScrapeOutcome.INVALID
+
+        if check_scraped(reference, ROWS_CACHE_FILE, save_dir):
+            return ScrapeOutcome.ALREADY_SCRAPED
 
-                if 'The page cannot be displayed because an internal server error has occurred.' in driver.page_source:
-                    raise InvalidDocumentException(f'{reference} document is unprocessable. It is invalid')
+        return ScrapeOutcome.OK
 
-                scraped = check_scraped(reference, 'rows.csv', save_dir)
-                if scraped:
-                    raise CachedException(f'{reference} document is already cached.')
+    def _process_documents(self, save_dir: str, dates: Dates, driver: Chrome, wait: WebDriverWait) -> None:
+
+        # Copy the references into a list first, since skipped documents are
+        # removed from the cache while iterating. The list keeps the crawl order.
+        references = get_reference_numbers(ROWS_CACHE_FILE, save_dir)
+        for reference in references.to_list() if references is not None else []:
+            outcome = self._check_document(reference, save_dir, driver)
 
-                status = self._get_release_status(driver, wait)
-                document = self._get_document_data(driver, wait)
-                if status != 'Released' and document.container_type == 'FCL':
-                    pass
+            try:
+                if outcome is ScrapeOutcome.OK:
+                    status = self._get_release_status(driver, wait)
+                    document = self._get_document_data(driver, wait)
+                    if status != 'Released' and document.container_type == 'FCL':
+                        pass
 
-            except (InvalidDocumentException, CachedException):
+            except InvalidDocumentException:
+                outcome = ScrapeOutcome.INVALID
+
+            if outcome is not ScrapeOutcome.OK:
                 logger.warning(f'Skipping... An error occurred while scraping the document [{Color.colorize(reference, Color.CYAN)}].')
-                remove_row_from_csv('rows.csv', save_dir, reference)
-                continue
+                remove_row_from_csv(ROWS_CACHE_FILE, save_dir, reference)
 
     def _get_release_status(self, driver: Chrome, wait: WebDriverWait) -> None:
         """
@@ -331,17 +357,17 @@ class IntercommerceScraper:
         table_xpath = '/html/body/form/table/tbody/tr[8]/td[2]'
 
         try:
-            table = wait.until(EC.presence_of_element_located((By.XPATH, table_xpath))).find_elements(By.TAG_NAME, 'td')
-            data = [child.text for child in table]
+            table = wait.until(EC.presence_of_element_located((By.XPATH, table_xpath)))
+            data = set(driver.execute_script(TABLE_CELLS_TEXT_SCRIPT, table))
 
-            if 'Released' in data or 'Transferred' in data:
+            if data & {'Released', 'Transferred'}:
                 return 'Released'
-            elif 'Approved' or 'Auto-Inspected' in data:
+            elif data & {'Approved', 'Auto-Inspected'}:
                 return 'Approved'
             else:
                 return None
 
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             raise InvalidDocumentException('Timed out. There are no release table in the document.')
 
     def _get_document_data(self, driver: Chrome, wait: WebDriverWait) -> Document:
@@ -366,5 +392,5 @@ class IntercommerceScraper:
 
             return document
 
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             raise InvalidDocumentException('Timed out. There are no document data in the document.')
\ No newline at end of file
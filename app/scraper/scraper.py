@@ -1,26 +1,43 @@
 import time
-import shutil
+from io import BytesIO
 from os import path
-from typing import Tuple
+from pathlib import Path
 
+import urllib3
 import polars as pl
-from selenium.webdriver import Chrome, ChromeOptions
+from selenium.webdriver import Chrome
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 from app.utils.colors import Color
+from app.scraper.driver import Driver
 from app.models.scraper import Account, Dates
 from app.config.logger import setup_logger
+from app.data_processing.pdf import read_container_number
 from app.utils.directory import (
         wait_for_download,
-        check_directory,
-        create_save_directory,
-        check_file
+        check_file,
+        get_cache_dir,
+        move_file
     )
 from app.config.settings import Settings
-from app.config.constants import WEBDRIVER_WAIT_TIMEOUT, DATA_DIR
+from app.utils.cache.auth_cache import get_cached_authentication, cache_authentication
+from app.config.constants import (
+        DATA_DIR,
+        INTERCOMMERCE_LOGIN_URL,
+        VBS_LOGIN_URL,
+        ATIMNL_ACCEPT_URL,
+        ATIMNL_TXN_URL,
+        ICTSI_ACCEPT_URL,
+        ICTSI_TXN_URL,
+        ROW_CELLS_TEXT_SCRIPT,
+        TABLE_CELLS_TEXT_SCRIPT,
+        HTTP_CONNECT_TIMEOUT,
+        HTTP_READ_TIMEOUT,
+        HTTP_RETRIES
+    )
 from app.models.scraper import Row, Document
 from app.utils.exceptions import (
         LoginFailedException,
@@ -30,52 +47,13 @@ from app.utils.exceptions import (
 
 logger = setup_logger(__name__)
 
-class Driver:
-    def __init__(self, wait=WEBDRIVER_WAIT_TIMEOUT['short'], download_dir=DATA_DIR) -> None:
-        self.wait_timeout = wait
-        self.download_dir = download_dir
-
-    def __enter__(self) -> Tuple[Chrome, WebDriverWait]:
-
-        # Setup the Chrome options.
-        options = ChromeOptions()
-
-        # Add headless mode option for background operation
-        # options.add_argument('--headless=new')  # Uncomment when ready
-
-        options.add_argument('--enable-chrome-browser-cloud-management')
-
-        # Disable the sandbox to prevent the browser from crashing.
-        options.add_argument('--disable-sandbox')
-        options.add_argument('--disable-dev-shm-usage')
-        options.page_load_strategy = 'normal'
-
-        options.add_experimental_option('prefs', {
-            'download.default_directory': self.download_dir,
-            'download.prompt_for_download': False,
-
-            # Enable the download directory upgrade.
-            'download.directory_upgrade': True,
-
-            # Make sure that the browser always opens the PDF files externally.
-            'plugin.always_open_pdf_externally': True
-        })
-
-        # Setup the Chrome driver.
-        self.driver = Chrome(options=options)
-        self.wait = WebDriverWait(self.driver, self.wait_timeout)
-
-        return self.driver, self.wait
-
-    def __exit__(self, exc_type, exc_value, traceback) -> None:
-        if hasattr(self, 'driver'):
-            self.driver.quit()
-
-        if exc_type is not None:
-            logger.error(f'An error occured: {exc_value}')
-
 class Scraper:
 
+    def __init__(self) -> None:
+        # Reused HTTP connection pool for fetching static files.
+        self.http = urllib3.PoolManager()
+        self.session_headers = {}
+
     def _verify_vbs_login(self, driver: Chrome, wait: WebDriverWait) -> bool:
         """
             Verifies whether the login to the VBS website was successful
@@ -93,7 +71,7 @@ class Scraper:
         try:
             wait.until(EC.presence_of_element_located((By.ID, 'msgHolder')))
             return False
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             return 'Login' not in driver.page_source
 
     def authenticate_vbs(self, account: Account) -> bool:
@@ -108,12 +86,17 @@ class Scraper:
                 bool: True if the account is valid, False otherwise.
         """
 
-        url = 'https://ictsi.vbs.1-stop.biz'
+        # Skip the browser entirely if the account was checked recently.
+        cached = get_cached_authentication('vbs', account)
+        if cached is not None:
+            if cached:
+                return True
+            raise LoginFailedException('Login failed. Please check your username and password.')
 
         with Driver() as (driver, wait):
 
             try:
-                driver.get(url)
+                driver.get(VBS_LOGIN_URL)
                 # Wait for the page to load and then login.
                 wait.until(EC.all_of(
                         EC.visibility_of_element_located((By.ID, 'USERNAME')),
@@ -126,7 +109,8 @@ class Scraper:
                 driver.find_element(By.ID, 'form1').submit()
 
                 # Verify if the login is successful.
-                login_successful = self._verify_vbs_login(wait)
+                login_successful = self._verify_vbs_login(driver, wait)
+                cache_authentication('vbs', account, login_successful)
                 if login_successful:
                     logger.info(f'Successfully logged in {Color.colorize("VBS", Color.BOLD)} account.')
                     return True
@@ -155,7 +139,7 @@ class Scraper:
         try:
             wait.until(EC.presence_of_element_located((By.NAME, 'frmCreate')))
             return False
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             return 'Incorrect Password' not in driver.page_source
 
 
@@ -171,12 +155,17 @@ class Scraper:
                 bool: True if the account is valid, False otherwise.
         """
 
-        url = 'https://www.intercommerce.com.ph/'
+        # Skip the browser entirely if the account was checked recently.
+        cached = get_cached_authentication('intercommerce', account)
+        if cached is not None:
+            if cached:
+                return True
+            raise LoginFailedException('Login failed. Please check your username and password.')
 
         with Driver() as (driver, wait):
 
             try:
-                driver.get(url)
+                driver.get(INTERCOMMERCE_LOGIN_URL)
                 # Wait for the page to load and then login.
                 wait.until(EC.all_of(
                         EC.visibility_of_element_located((By.NAME, 'clientid')),
@@ -190,6 +179,7 @@ class Scraper:
 
                 # Verify if the login is successful.
                 login_successful = self._verify_intercommerce_login(driver, wait)
+                cache_authentication('intercommerce', account, login_successful)
                 if login_successful:
                     logger.info(f'Successfully logged in {Color.colorize("InterCommerce", Color.BOLD)} account.')
                     return True
@@ -211,14 +201,11 @@ class Scraper:
                 to_directory (str): the name of the directory to which to move the file.
         """
 
-        if not check_directory(path.join(DATA_DIR, to_directory)):
-            logger.error(f'An error occured on moving the {Color.colorize("ATI.CSV", Color.BOLD)} file.')
-            create_save_directory(to_directory)
+        # Make sure the cache directory exists in a single call.
+        cache_dir = Path(get_cache_dir(to_directory))
+        cache_dir.mkdir(parents=True, exist_ok=True)
 
-        src = path.join(DATA_DIR, filename)
-        dst = path.normpath(f'{DATA_DIR}/documents/{to_directory}/cache/ati.csv')
-
-        shutil.move(src, dst)
+        move_file(path.join(DATA_DIR, filename), cache_dir / 'ati.csv')
         logger.info(f'Moved file: [{Color.colorize(filename, Color.CYAN)}] to directory: [{Color.colorize(to_directory, Color.CYAN)}].')
 
     def download_ati(self, account: Account, dates: Dates) -> None:
@@ -233,12 +220,11 @@ class Scraper:
         """
 
         save_dir = f'{dates.start_date.strftime("%b %d %Y")} - {dates.end_date.strftime("%b %d %Y")}'
-        url = 'https://ictsi.vbs.1-stop.biz'
 
         with Driver() as (driver, wait):
             try:
                 # Login to the VBS website.
-                driver.get(url)
+                driver.get(VBS_LOGIN_URL)
                 logger.info(f'Logging in to {Color.colorize("Intercommerce", Color.BOLD)} account and downloading {Color.colorize("ATI", Color.BOLD)} data.')
                 # Wait for the page to load and then login.
                 wait.until(EC.all_of(
@@ -253,12 +239,12 @@ class Scraper:
                 # Wait for the page to load and then go to the terms and conditions page.
                 wait.until(EC.presence_of_element_located((By.ID, 'vbs_new_selected_facilityid')))
                 # Accept the terms and conditions.
-                driver.get('https://atimnl.vbs.1-stop.biz/Default.aspx?vbs_Facility_Changed=true&vbs_new_selected_FACILITYID=ATIMNL')
+                driver.get(ATIMNL_ACCEPT_URL)
                 wait.until(EC.element_to_be_clickable((By.ID, 'Accept'))).click()
 
                 # Wait for the page to load and then go to the transactions page.
                 wait.until(EC.presence_of_element_located((By.ID, 'NotifyMessages')))
-                driver.get('https://atimnl.vbs.1-stop.biz/PointsTransactions.aspx')
+                driver.get(ATIMNL_TXN_URL)
 
                 # Change the dates in the form.
                 # Date from.
@@ -304,14 +290,11 @@ class Scraper:
                 to_directory (str): the name of the directory to which to move the file.
         """
 
-        if not check_directory(path.join(DATA_DIR, to_directory)):
-            logger.error(f'An error occured on moving the {Color.colorize("MICTSI.CSV", Color.BOLD)} file.')
-            create_save_directory(to_directory)
-
-        src = path.join(DATA_DIR, filename)
-        dst = path.normpath(f'{DATA_DIR}/documents/{to_directory}/cache/mictsi.csv')
+        # Make sure the cache directory exists in a single call.
+        cache_dir = Path(get_cache_dir(to_directory))
+        cache_dir.mkdir(parents=True, exist_ok=True)
 
-        shutil.move(src, dst)
+        move_file(path.join(DATA_DIR, filename), cache_dir / 'mictsi.csv')
         logger.info(f'Moved file: [{Color.colorize(filename, Color.CYAN)}] to directory: [{Color.colorize(to_directory, Color.CYAN)}].')
 
     def download_mictsi(self, account: Account, dates: Dates) -> None:
@@ -326,12 +309,11 @@ class Scraper:
         """
 
         save_dir = f'{dates.start_date.strftime("%b %d %Y")} - {dates.end_date.strftime("%b %d %Y")}'
-        url = 'https://ictsi.vbs.1-stop.biz'
 
         with Driver() as (driver, wait):
             try:
                 # Login to the VBS website.
-                driver.get(url)
+                driver.get(VBS_LOGIN_URL)
                 logger.info(f'Logging in to {Color.colorize("Intercommerce", Color.BOLD)} account and downloading {Color.colorize("MICTSI", Color.BOLD)} data.')
 
                 # Wait for the page to load and then login.
@@ -347,12 +329,12 @@ class Scraper:
                 # Wait for the page to load and then go to the terms and conditions page.
                 wait.until(EC.presence_of_element_located((By.ID, 'vbs_new_selected_facilityid')))
                 # Wait for the page to load and then go to the terms and conditions page.
-                driver.get('https://ictsi.vbs.1-stop.biz/Default.aspx?vbs_Facility_Changed=true&vbs_new_selected_FACILITYID=ICTSI')
+                driver.get(ICTSI_ACCEPT_URL)
                 wait.until(EC.element_to_be_clickable((By.ID, 'Accept'))).click()
 
                 # Wait for the page to load and then go to the transactions page.
                 wait.until(EC.presence_of_element_located((By.ID, 'NotifyMessages')))
-                driver.get('https://ictsi.vbs.1-stop.biz/PointsTransactions.aspx')
+                driver.get(ICTSI_TXN_URL)
 
                 # Change the dates in the form.
                 # Date from.
@@ -387,50 +369,63 @@ class Scraper:
             except TimeoutException:
                 logger.error('Timed out. The page took too long to load.')
 
-    def _get_container_number_from_pdf(self, reference_no: str, driver: Chrome, filename: Optional[str]) -> str:
+    def _copy_session_cookies(self, driver: Chrome) -> None:
+        """
+            Copies the cookies of the logged in browser session so that
+            static files (e.g. the document PDFs) can be fetched directly
+            over HTTP without going through the browser.
+
+            Parameters:
+                driver (Driver): The web driver.
+        """
+
+        cookies = '; '.join(f'{cookie["name"]}={cookie["value"]}' for cookie in driver.get_cookies())
+        self.session_headers = {'Cookie': cookies}
+
+    def _get_container_number_from_pdf(self, reference_no: str) -> str:
         """
             Extracts the container number from a PDF file.
-            The PDF file is downloaded from the InterCommerce website.
+            The PDF file is downloaded from the InterCommerce website
+            in memory using the cookies of the logged in browser session.
 
             Parameters:
                 reference_no (str): The reference number of the document.
-                driver (Driver): The web driver.
-                filename (str): The name of the PDF file.
 
             Returns:
                 str: The extracted container number.
         """
 
         url = f'https://www.intercommerce.com.ph/WebCWS/pdf/sadPEZAEXP.php?aplid={reference_no}'
-        driver.get(url)
-
         try:
-            if wait_for_download('doc.pdf'):
-                 with open(f'{DATA_DIR}/{filename}', 'rb') as file:
-                    reader = PdfReader(file, strict=False)
-                    logger.info(f'Extracting container number from PDF for [{Color.colorize(reference_no, Color.CYAN)}].')
-                    texts = reader.pages[0].extract_text().replace('- Container No(s) -', '').split('\n')
+            response = self.http.request(
+                'GET', url,
+                headers=self.session_headers,
+                timeout=urllib3.Timeout(connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT),
+                retries=urllib3.Retry(total=HTTP_RETRIES, backoff_factor=0.5)
+            )
+        except urllib3.exceptions.HTTPError as e:
+            logger.debug(f'Failed to download the PDF for {reference_no}: {e}')
+            raise InvalidDocumentException(f'{reference_no} document could not be downloaded.')
 
-                    for text in texts:
-                        if 'Container No' in text:
-                            container_number = text.rsplit(' ', 1)[1].strip()
-                            logger.info(f'Container number extracted successfully for [{Color.colorize(reference_no, Color.CYAN)}].')
-                            return container_number
+        # A PDF starts with "%PDF-" within its first 1024 bytes. Anything else
+        # (e.g. the login page once the session expired) is not a document.
+        if response.status == 200 and b'%PDF-' in response.data[:1024]:
+            logger.info(f'Extracting container number from PDF for [{Color.colorize(reference_no, Color.CYAN)}].')
+            container_number = read_container_number(BytesIO(response.data))
 
-            # If the PDF file is not downloaded, raise an exception.
-            raise InvalidDocumentException(f'{reference_no} document is unprocessable. It is invalid')
+            if container_number is not None:
+                logger.info(f'Container number extracted successfully for [{Color.colorize(reference_no, Color.CYAN)}].')
+                return container_number
 
-        finally:
-            remove(f'{DATA_DIR}/{filename}')
+        # If the PDF file could not be downloaded or read, raise an exception.
+        raise InvalidDocumentException(f'{reference_no} document is unprocessable. It is invalid')
 
     def crawl_database(self, account: Account, dates: Dates, branch: str) -> None:
 
-        url = 'https://www.intercommerce.com.ph/'
-
         with Driver() as (driver, wait):
             try:
                 # Login to the Intercommerce website.
-                driver.get(url)
+                driver.get(INTERCOMMERCE_LOGIN_URL)
                 logger.info(f'Logging in to {Color.colorize("Intercommerce", Color.BOLD)} account.')
 
                 wait.until(EC.all_of(
@@ -445,6 +440,10 @@ class Scraper:
 
                 # Wait for the page to load and then go to the data page.
                 wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, 'toplink')))
+
+                # Share the logged in session with the HTTP client, now that
+                # the login has finished and the session cookies are set.
+                self._copy_session_cookies(driver)
                 time.sleep(2) # ⚠️ This is a temporary fix. Our code is too fast hence. ⚠️
 
                 # Start craping the documents from the Intercommerce database.
@@ -456,19 +455,23 @@ class Scraper:
                         print('test 2')
                         # Get the row data from the table in the page.
                         row_xpath = f'/html/body/form/table/tbody/tr[9]/td[2]/table/tbody/tr/td/div/table/tbody/tr/td/table/tbody/tr[{row_id}]'
-                        row = wait.until(EC.presence_of_element_located((By.XPATH, row_xpath))).find_elements(By.XPATH, './*')
+                        row = wait.until(EC.presence_of_element_located((By.XPATH, row_xpath)))
                         row_data = Row.from_array(
-                            [child.text for child in row]
+                            driver.execute_script(ROW_CELLS_TEXT_SCRIPT, row)
                         )
 
-                        # Skip the document if it is not in the date range or if the status is not 'AG'.
-                        if (dates.end_date < row_data.creation_date < dates.start_date) or row_data.status != 'AG':
+                        # Skip the document if it is not in the date range. The rows are
+                        # sorted from newest to oldest so we stop scraping once we reach
+                        # a row older than the start date.
+                        if not (dates.start_date <= row_data.creation_date <= dates.end_date):
+                            if row_data.creation_date < dates.start_date:
+                                logger.info('Scraping stopped. The date is out of range.')
+                                return
                             raise InvalidDocumentException(f'{row_data.reference_number} document is unprocessable. It is invalid')
 
-                        # Stop scraping if the current dates are out of range.
-                        if dates.end_date > row_data.creation_date:
-                            logger.info('Scraping stopped. The date is out of range.')
-                            return
+                        # Skip the document if the status is not 'AG'.
+                        if row_data.status != 'AG':
+                            continue
 
                         # Scrape the document in the current row.
                         self.scrape_document(driver, wait, row_data)
@@ -482,13 +485,13 @@ class Scraper:
                 logger.error('Timed out. The page took too long to load.')
                 raise LoadingFailedException('Timed out. The page took too long to load.')
 
-    def _get_release_table(self, wait: WebDriverWait) -> str:
+    def _get_release_table(self, driver: Chrome, wait: WebDriverWait) -> str:
         table_xpath = '/html/body/form/table/tbody/tr[8]/td[2]'
         try:
-            table = wait.until(EC.presence_of_element_located((By.XPATH, table_xpath))).find_elements(By.TAG_NAME, 'td')
-            data = [child.text for child in table]
+            table = wait.until(EC.presence_of_element_located((By.XPATH, table_xpath)))
+            data = set(driver.execute_script(TABLE_CELLS_TEXT_SCRIPT, table))
 
-            if "Released" in data or "Transferred" in data:
+            if data & {"Released", "Transferred"}:
                 return "Released"
             elif "Approved" in data:
                 return "Approved"
@@ -520,6 +523,6 @@ class Scraper:
                 pass
 
 
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             logger.error(f'An error occurred while scraping the document [{Color.colorize(row_data.reference_number, Color.CYAN)}].')
             raise InvalidDocumentException(f'{row_data.reference_number} document is unprocessable. It is invalid')
\ No newline at end of file
@@ -1,22 +1,27 @@
 import shutil
-from os import path
-from typing import Optional
+import threading
+from os import path, getpid, makedirs
+from tempfile import mkdtemp
+from multiprocessing import Pool, cpu_count
+from typing import List, Optional, Tuple
 
 from selenium.webdriver import Chrome
 from selenium.webdriver.support.ui import WebDriverWait
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 
 from app.utils.colors import Color
+from app.utils.cache.auth_cache import account_key
 from app.scraper.driver import Driver
 from app.config.logger import setup_logger
-from app.config.constants import DATA_DIR, DOC_DIR
+from app.config.constants import DATA_DIR, DOC_DIR, SET_DATE_RANGE_SCRIPT
 from app.models.scraper import (
     Account,
     Dates
 )
 from app.utils.directory import (
+    move_file,
     wait_for_download,
     create_save_directory
 )
@@ -29,9 +34,38 @@ logger = setup_logger(__name__)
 
 class VBSScraper:
 
-    def __init__(self):
+    def __init__(self, download_dir: str = '', user_data_dir: Optional[str] = None):
         self.url = 'https://vbs.1-stop.biz'
 
+        # Company specific URL templates, built once from the host name.
+        self._host = self.url.removeprefix('https://')
+        self._landing = f'https://{{c}}.{self._host}/Landing.aspx?/Default.aspx?vbs_Facility_Changed=true&vbs_new_selected_FACILITYID={{C}}'
+        self._points = f'https://{{c}}.{self._host}/PointsTransactions.aspx'
+
+        # The download directory is relative to DATA_DIR. Browsers running
+        # at the same time need their own download directory and profile.
+        self.download_dir = download_dir
+        self.user_data_dir = user_data_dir
+
+        # Inside the context manager, the browser session is kept open between
+        # calls so that Chrome is only started and logged in once. It is only
+        # reused for the same credentials (username and password hash) it was
+        # logged in with. Outside of it, every call quits the browser when done.
+        # Selenium is not thread-safe, so every use goes through the lock.
+        self._keep_session = False
+        self._driver: Optional[Driver] = None
+        self._session: Optional[Tuple[Chrome, WebDriverWait]] = None
+        self._credentials: Optional[Tuple[str, str, bytes]] = None
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> 'VBSScraper':
+        self._keep_session = True
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback) -> None:
+        self._keep_session = False
+        self.close()
+
     def _verify_login(self, driver: Chrome, wait: WebDriverWait) -> bool:
         """
         Verify if the login was successful by checking for the presence of specific elements.
@@ -49,9 +83,93 @@ class VBSScraper:
         try:
             wait.until(EC.presence_of_element_located((By.ID, 'error-element-password')))
             return False
-        except TimeoutException or NoSuchElementException:
+        except (TimeoutException, NoSuchElementException):
             return 'Login was unsuccessful' not in driver.page_source
 
+    def _get_session(self) -> Tuple[Chrome, WebDriverWait]:
+        """
+        Get the browser session, starting Chrome if it is not running yet.
+
+        Returns:
+            Tuple[Chrome, WebDriverWait]: The Selenium WebDriver and WebDriverWait instances.
+        """
+        if self._session is None:
+            download_dir = path.join(DATA_DIR, self.download_dir)
+            makedirs(download_dir, exist_ok=True)
+
+            self._driver = Driver(download_dir=download_dir, user_data_dir=self.user_data_dir)
+            self._session = self._driver.__enter__()
+
+        return self._session
+
+    def _is_logged_in(self, account: Account) -> bool:
+        """
+        Check if the browser session is still logged in with the given account.
+        The session must have been logged in with the same username and password,
+        and the website must not show the login form anymore (e.g. because the
+        session expired on the server).
+
+        Parameters:
+            account (Account): The account object containing the username and password.
+
+        Returns:
+            bool: True if the session can be reused, False otherwise.
+        """
+        if self._session is None or self._credentials != account_key('vbs', account):
+            return False
+
+        driver, _ = self._session
+        try:
+            driver.get(self.url)
+            # The login form is only shown to sessions that are not logged in.
+            if driver.find_elements(By.ID, 'password'):
+                self._credentials = None
+                return False
+            return True
+        except WebDriverException:
+            # The browser was closed or crashed, so start a new one next time.
+            self.close()
+            return False
+
+    def _login(self, account: Account) -> Tuple[Chrome, WebDriverWait]:
+        """
+        Log in to the VBS system in the browser session.
+
+        Parameters:
+            account (Account): The account object containing the username and password.
+
+        Returns:
+            Tuple[Chrome, WebDriverWait]: The logged in Selenium WebDriver and WebDriverWait instances.
+
+        Raises:
+            LoginFailedException: If the login fails due to incorrect credentials.
+        """
+        driver, wait = self._get_session()
+
+        # Start from a logged out session, in case the browser is still
+        # logged in with other credentials. delete_all_cookies() only clears
+        # the cookies of the current page, while the login form is served
+        # from another host, so clear the cookies of every host instead.
+        self._credentials = None
+        driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+        driver.get(self.url)
+
+        wait.until(EC.all_of(
+            EC.visibility_of_element_located((By.ID, 'username')),
+            EC.visibility_of_element_located((By.ID, 'password'))
+        ))
+
+        driver.find_element(By.ID, 'username').send_keys(account.username)
+        driver.find_element(By.ID, 'password').send_keys(account.password.get_secret_value())
+        driver.find_element(By.TAG_NAME, 'form').submit()
+
+        if not self._verify_login(driver, wait):
+            raise LoginFailedException('Login to VBS failed. Please check your credentials.')
+
+        self._credentials = account_key('vbs', account)
+        logger.info('Successfully logged in VBS account.')
+        return driver, wait
+
     def authenticate(self, account: Account) -> bool:
         """
         Authenticate the user with the VBS system using the provided credentials.
@@ -59,6 +177,10 @@ class VBSScraper:
         It waits for the page to load and checks for the presence of specific elements
         to determine if the login was successful.
 
+        The credentials are always checked with a new login. When the scraper is
+        used as a context manager, the browser session stays logged in afterwards
+        so that download_data() can reuse it. Otherwise the browser is quit.
+
         Parameters:
             account (Account): The account object containing the username and password.
 
@@ -69,29 +191,30 @@ class VBSScraper:
             LoginFailedException: If the login fails due to incorrect credentials.
             LoadingFailedException: If the page takes too long to load or elements are not found.
         """
-        with Driver() as (driver, wait):
+        with self._lock:
             try:
-                driver.get(self.url)
-
-                wait.until(EC.all_of(
-                    EC.visibility_of_element_located((By.ID, 'username')),
-                    EC.visibility_of_element_located((By.ID, 'password'))
-                ))
+                self._login(account)
+                return True
 
-                driver.find_element(By.ID, 'username').send_keys(account.username)
-                driver.find_element(By.ID, 'password').send_keys(account.password.get_secret_value())
-                driver.find_element(By.TAG_NAME, 'form').submit()
+            except (TimeoutException, NoSuchElementException) as e:
+                logger.debug(f'Failed to log in to VBS: {e}')
+                logger.error('Timed out. The VBS page took too long to load.')
+                raise LoadingFailedException('Timed out. The VBS page took too long to load.')
 
-                login_successful = self._verify_login(driver, wait)
-                if login_successful:
-                    logger.info('Successfully logged in VBS account.')
-                    return True
+            finally:
+                if not self._keep_session:
+                    self.close()
 
-                raise LoginFailedException('Login to VBS failed. Please check your credentials.')
+    def close(self) -> None:
+        """
+        Close the browser session if one is running.
+        """
+        if self._driver is not None:
+            self._driver.__exit__(None, None, None)
 
-            except TimeoutException or NoSuchElementException:
-                logger.error('Timed out. The VBS page took too long to load.')
-                raise LoadingFailedException('Timed out. The VBS page took too long to load.')
+        self._driver = None
+        self._session = None
+        self._credentials = None
 
     def _generate_save_directory(self, dates: Dates) -> str:
         """
@@ -121,14 +244,12 @@ class VBSScraper:
             wait (WebDriverWait): The WebDriverWait instance for waiting for elements.
             company (str): The company name to be used in the URL.
         """
-        # Go to the terms and conditions page.
-        # We need to get rid of the 'https://' part of the URL to get the company
-        # name hence we do the slicing [8:].
-        driver.get(f'https://{company.lower()}.{self.url[8:]}/Landing.aspx?/Default.aspx?vbs_Facility_Changed=true&vbs_new_selected_FACILITYID={company.upper()}')
+        # Go to the terms and conditions page on the company's subdomain.
+        driver.get(self._landing.format(c=company.lower(), C=company.upper()))
         wait.until(EC.element_to_be_clickable((By.ID, 'Accept'))).click()
 
         wait.until(EC.presence_of_element_located((By.ID, 'NotifyMessages')))
-        driver.get(f'https://{company.lower()}.{self.url[8:]}/PointsTransactions.aspx')
+        driver.get(self._points.format(c=company.lower()))
 
     def _move_download_file(self, src_filename: str, dest_dir: str, dest_filename: str) -> None:
         """
@@ -139,10 +260,10 @@ class VBSScraper:
             dest_dir (str): The destination directory where the file will be moved.
             dest_filename (str): The new name for the file in the destination directory.
         """
-        src_path = path.join(DATA_DIR, src_filename)
+        src_path = path.join(DATA_DIR, self.download_dir, src_filename)
         dest_path = path.join(DOC_DIR, dest_dir, dest_filename)
 
-        shutil.move(src_path, dest_path)
+        move_file(src_path, dest_path)
         logger.info(f'File moved to [{Color.colorize(dest_path, Color.CYAN)}]')
 
     def download_data(self, account: Account, dates: Dates, company: str,
@@ -150,52 +271,37 @@ class VBSScraper:
         """
         Download data from the VBS system using the provided account credentials and date range.
         This method uses the Selenium WebDriver to interact with the VBS system and download the data.
+        When the scraper is used as a context manager, the logged in browser
+        session is reused between calls.
 
         Parameters:
-            driver (Chrome): The Selenium WebDriver instance.
-            wait (WebDriverWait): The WebDriverWait instance for waiting for elements.
             account (Account): The account object containing the username and password.
             dates (Dates): The Dates object containing the start and end dates.
             company (str): The company name to be used in the URL.
             csv_filename (str): The name of the CSV file to be downloaded.
+            db_wait (int): How long to wait for the database query to finish, in seconds.
         """
 
         save_dir = self._generate_save_directory(dates)
 
-        with Driver() as (driver, wait):
+        with self._lock:
             try:
-                driver.get(self.url)
-
-                wait.until(EC.all_of(
-                        EC.visibility_of_element_located((By.ID, 'username')),
-                        EC.visibility_of_element_located((By.ID, 'password'))
-                    )
-                )
-
-                driver.find_element(By.ID, 'username').send_keys(account.username)
-                driver.find_element(By.ID, 'password').send_keys(account.password.get_secret_value())
-                driver.find_element(By.TAG_NAME, 'form').submit()
-
-                # Wait for the page to load and then go to the terms and conditions page.
-                wait.until(EC.presence_of_element_located((By.ID, 'vbs_new_selected_facilityid')))
+                # Reuse the logged in browser session when possible.
+                if self._is_logged_in(account):
+                    driver, wait = self._session
+                else:
+                    driver, wait = self._login(account)
 
                 # Accept the terms and conditions.
                 self._accept_terms_and_conditions(driver, wait, company)
 
-                # Change the dates in the form.
-                # DATE FROM.
-                element = wait.until(EC.element_to_be_clickable((By.ID, 'PointsTransactionsSearchForm___DATEFROM')))
-                driver.execute_script('arguments[0].removeAttribute("readonly")',
-                                      element)
-                element.clear()
-                element.send_keys(f'{dates.start_date.day}/{dates.start_date.month}/{dates.start_date.year}')
-
-                # DATE TO.
-                element = wait.until(EC.element_to_be_clickable((By.ID, 'PointsTransactionsSearchForm___DATETO')))
-                driver.execute_script('arguments[0].removeAttribute("readonly")',
-                                      element)
-                element.clear()
-                element.send_keys(f'{dates.end_date.day}/{dates.end_date.month}/{dates.end_date.year}')
+                # Change the dates in the form with a single script call.
+                wait.until(EC.presence_of_element_located((By.ID, 'PointsTransactionsSearchForm___DATETO')))
+                driver.execute_script(
+                    SET_DATE_RANGE_SCRIPT,
+                    f'{dates.start_date.day}/{dates.start_date.month}/{dates.start_date.year}',
+                    f'{dates.end_date.day}/{dates.end_date.month}/{dates.end_date.year}'
+                )
 
                 # Request for the data from the database.
                 driver.find_element(By.ID, 'PointsTransactionsSearchForm___REFERENCE').click()
@@ -206,8 +312,64 @@ class VBSScraper:
                 )
                 element.click()
 
-                if wait_for_download('PointsTransactions.csv'):
+                if wait_for_download('PointsTransactions.csv', self.download_dir):
                     self._move_download_file('PointsTransactions.csv', save_dir, csv_filename)
 
-            except TimeoutException or NoSuchElementException:
-                logger.error('Timed out. The page took too long to load.')
\ No newline at end of file
+            except (TimeoutException, NoSuchElementException) as e:
+                logger.debug(f'Failed to download the {company} data: {e}')
+                logger.error('Timed out. The page took too long to load.')
+                # The session may have expired, so start a new one next time.
+                self.close()
+
+            finally:
+                if not self._keep_session:
+                    self.close()
+
+    def download_data_batch(self, account: Account, dates: Dates, companies: List[str],
+                            csv_filenames: List[str]) -> None:
+        """
+        Download the data of several companies at the same time.
+        Each company is downloaded in its own process with its own browser,
+        since Selenium does not work well with threads.
+
+        On Windows, this must be called from within an `if __name__ == '__main__':` block.
+
+        Parameters:
+            account (Account): The account object containing the username and password.
+            dates (Dates): The Dates object containing the start and end dates.
+            companies (List[str]): The company names to be used in the URL.
+            csv_filenames (List[str]): The name of the CSV file to be downloaded for each company.
+        """
+        if len(companies) != len(csv_filenames):
+            raise ValueError('Each company must have exactly one CSV filename.')
+
+        # Create the save directory once so the workers do not race to create it.
+        self._generate_save_directory(dates)
+
+        with Pool(processes=min(len(companies), cpu_count())) as pool:
+            pool.starmap(_download_data_worker, [
+                (account, dates, company, csv_filename)
+                for company, csv_filename in zip(companies, csv_filenames)
+            ])
+
+def _download_data_worker(account: Account, dates: Dates, company: str, csv_filename: str) -> None:
+    """
+    Download the data of one company in a worker process.
+
+    Parameters:
+        account (Account): The account object containing the username and password.
+        dates (Dates): The Dates object containing the start and end dates.
+        company (str): The company name to be used in the URL.
+        csv_filename (str): The name of the CSV file to be downloaded.
+    """
+    download_dir = f'vbs-{getpid()}'
+    user_data_dir = mkdtemp(prefix='vbs-profile-')
+
+    try:
+        with VBSScraper(download_dir=download_dir, user_data_dir=user_data_dir) as scraper:
+            scraper.download_data(account, dates, company, csv_filename)
+    finally:
+        # The downloaded file has been moved to the save directory by now, so
+        # the worker's download directory and Chrome profile can be removed.
+        shutil.rmtree(path.join(DATA_DIR, download_dir), ignore_errors=True)
+        shutil.rmtree(user_data_dir, ignore_errors=True)
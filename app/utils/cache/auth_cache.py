@@ -0,0 +1,76 @@
+import time
+import hashlib
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.models.scraper import Account
+from app.config.constants import (
+    AUTH_CACHE_TTL,
+    AUTH_CACHE_FAILURE_TTL,
+    AUTH_CACHE_MAX_SIZE
+)
+
+# Maps (website, username, password hash) to (expiry time, result).
+_auth_cache: Dict[Tuple[str, str, bytes], Tuple[float, bool]] = {}
+# Guards the eviction and insertion in cache_authentication.
+_lock = threading.Lock()
+
+def account_key(website: str, account: Account) -> Tuple[str, str, bytes]:
+    """
+    Build the key identifying an account's credentials. The password is
+    hashed so that it is never kept in memory in plain text.
+
+    Parameters:
+        website (str): The website the account belongs to.
+        account (Account): The account object containing the username and password.
+
+    Returns:
+        Tuple[str, str, bytes]: The cache key.
+    """
+    password_hash = hashlib.sha256(account.password.get_secret_value().encode()).digest()
+    return website, account.username, password_hash
+
+def get_cached_authentication(website: str, account: Account) -> Optional[bool]:
+    """
+    Get the cached authentication result of an account.
+
+    Parameters:
+        website (str): The website the account belongs to.
+        account (Account): The account object containing the username and password.
+
+    Returns:
+        Optional[bool]: The cached result, or None if it is missing or expired.
+    """
+    key = account_key(website, account)
+    cached = _auth_cache.get(key)
+
+    if cached is None:
+        return None
+
+    expires_at, result = cached
+    if time.monotonic() >= expires_at:
+        _auth_cache.pop(key, None)
+        return None
+
+    return result
+
+def cache_authentication(website: str, account: Account, result: bool) -> None:
+    """
+    Cache the authentication result of an account. Successful logins are
+    kept for AUTH_CACHE_TTL seconds and failed ones for AUTH_CACHE_FAILURE_TTL.
+
+    Parameters:
+        website (str): The website the account belongs to.
+        account (Account): The account object containing the username and password.
+        result (bool): True if the login was successful, False otherwise.
+    """
+    key = account_key(website, account)
+    ttl = AUTH_CACHE_TTL if result else AUTH_CACHE_FAILURE_TTL
+
+    with _lock:
+        # Drop the oldest entry once the cache is full, unless the account
+        # is already cached and is only being updated.
+        if key not in _auth_cache and len(_auth_cache) >= AUTH_CACHE_MAX_SIZE:
+            _auth_cache.pop(next(iter(_auth_cache)), None)
+
+        _auth_cache[key] = (time.monotonic() + ttl, result)
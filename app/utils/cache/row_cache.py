@@ -1,71 +1,218 @@
-from os import path
-from typing import List
+import atexit
+from os import path, remove
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
 import polars as pl
-from polars import Series
+from polars import Series, DataFrame
 
-from app.models.scraper import Row
-from app.utils.colors import Color
+from app.models.scraper import Row, ScrapeOutcome
 from app.config.logger import setup_logger
-from app.config.constants import DOC_DIR
-from app.data_processing.dataframe import load_csv_file
-from app.utils.directory import check_file
-from app.utils.exceptions import CachedException
+from app.config.constants import ROW_BUFFER_SIZE
+from app.utils.directory import get_cache_dir
+from app.data_processing.dataframe import load_csv_file, load_parquet_file
 
 logger = setup_logger(__name__)
 
-def cache_row(row: List[Row], save_dir: str) -> None:
+# The rows are cached as Parquet so that the column types (e.g. the
+# creation_date) are kept and do not have to be parsed on every load.
+ROWS_CACHE_FILE = 'rows.parquet'
+LEGACY_ROWS_CACHE_FILE = 'rows.csv'
+
+# Column types of the cached rows, matching a DataFrame built from Row models.
+ROWS_SCHEMA = pl.Schema({
+    'reference_number': pl.String,
+    'status': pl.String,
+    'document_declaration_type': pl.String,
+    'consignee': pl.String,
+    'waybill': pl.String,
+    'number_of_containers': pl.Int64,
+    'document_number': pl.String,
+    'creation_date': pl.Date,
+    'scraped': pl.Boolean
+})
+
+# The cached rows of each save directory are kept in memory together with
+# a set of their reference numbers, so that caching a row does not have to
+# read the whole cache file again. Changes are written by flush_row_cache().
+_ref_cache: Dict[str, Tuple[Set[str], Optional[DataFrame]]] = {}
+_unflushed: Set[str] = set()
+
+# New rows are buffered and added to the frame in batches, since stacking
+# a frame one row at a time copies it over and over again.
+_buffer: Dict[str, List[Row]] = {}
+
+def migrate_legacy_row_cache(save_dir: str) -> Optional[DataFrame]:
     """
-    Cache a row of data into a CSV file.
+    Convert the legacy CSV rows cache of a save directory to Parquet.
+    The CSV file is removed once the Parquet file has been written.
+
+    Parameters:
+        save_dir (str): The directory where the cached rows are stored.
+
+    Returns:
+        Optional[DataFrame]: The migrated rows, or None if there is no legacy cache.
+    """
+    # Read every column as a string. Guessing the types would e.g. turn
+    # all-digit reference numbers into integers.
+    rows = load_csv_file(LEGACY_ROWS_CACHE_FILE, save_dir, infer_schema=False)
+    if rows is None:
+        return None
+
+    rows = rows.select(
+        *(pl.col(name) for name, dtype in ROWS_SCHEMA.items() if dtype == pl.String),
+        pl.col('number_of_containers').cast(pl.Int64),
+        pl.col('creation_date').str.to_date('%Y-%m-%d'),
+        pl.col('scraped').str.to_lowercase() == 'true'
+    ).select(ROWS_SCHEMA.names())
+
+    cache_dir = get_cache_dir(save_dir)
+    rows.write_parquet(path.join(cache_dir, ROWS_CACHE_FILE))
+    remove(path.join(cache_dir, LEGACY_ROWS_CACHE_FILE))
+
+    logger.info('Migrated the rows cache of [%s] to Parquet.', save_dir)
+    return rows
+
+def _load_row_cache(save_dir: str) -> Tuple[Set[str], Optional[DataFrame]]:
+    """
+    Load the cached rows of a save directory into memory on first use.
 
     Parameters:
-        row (List[Row]): The row of data to cache.
         save_dir (str): The directory where the cached rows are stored.
 
-    Raises:
-        CachedException: If the reference number already exists in the cache.
+    Returns:
+        Tuple[Set[str], Optional[DataFrame]]: The cached reference numbers and rows.
     """
-    cache_file = path.join(DOC_DIR, save_dir, 'cache', 'rows.csv')
+    if save_dir not in _ref_cache:
+        rows = load_parquet_file(ROWS_CACHE_FILE, save_dir)
+        if rows is None:
+            rows = migrate_legacy_row_cache(save_dir)
+
+        if rows is not None:
+            _ref_cache[save_dir] = (set(rows.get_column('reference_number').to_list()), rows)
+        else:
+            _ref_cache[save_dir] = (set(), None)
 
-    if not check_file('rows.csv', 'documents', save_dir, 'cache'):
-        pl.DataFrame(row).write_csv(cache_file)
-        logger.info(f'Row with reference number [{Color.colorize(row[0].reference_number, Color.CYAN)}] cached successfully.')
+    return _ref_cache[save_dir]
+
+def _merge_buffer(save_dir: str) -> Optional[DataFrame]:
+    """
+    Add the buffered rows of a save directory to its in-memory rows frame.
+
+    Parameters:
+        save_dir (str): The directory where the cached rows are stored.
+
+    Returns:
+        Optional[DataFrame]: The cached rows, or None if there are none.
+    """
+    references, rows = _load_row_cache(save_dir)
+    buffered = _buffer.pop(save_dir, None)
+
+    if buffered:
+        new_rows = pl.DataFrame(buffered)
+        if rows is None:
+            rows = new_rows
+        else:
+            rows.vstack(new_rows, in_place=True)
+        _ref_cache[save_dir] = (references, rows)
+
+    return rows
+
+def flush_row_cache(save_dir: str) -> None:
+    """
+    Write the cached rows of a save directory to its cache file.
+    Does nothing if there are no new rows since the last flush.
+
+    Parameters:
+        save_dir (str): The directory where the cached rows are stored.
+    """
+    if save_dir not in _unflushed:
         return
 
-    if _check_reference_number(row[0].reference_number, save_dir):
-        logger.warning(f'The reference number [{Color.colorize(row[0].reference_number, Color.CYAN)}] already exists in the cache.')
-        raise CachedException('The reference number already exists in the cache.')
+    rows = _merge_buffer(save_dir)
+    rows.write_parquet(path.join(get_cache_dir(save_dir), ROWS_CACHE_FILE))
+    _unflushed.discard(save_dir)
 
-    # Load the existing cache and append the new row.
-    old_cache = load_csv_file('rows.csv', save_dir)
-    old_cache = old_cache.with_columns(pl.col('creation_date').str.to_date('%Y-%m-%d')) # Convert the creation_date column to date type since
-                                                                                        # CSV files cannot store date types and are stored as strings
-                                                                                        # by default.
-    new_cache = pl.concat([old_cache, pl.DataFrame(row)])
-    new_cache.write_csv(cache_file)
+@atexit.register
+def _flush_all_row_caches() -> None:
+    """
+    Write the rows of every save directory that has unflushed changes.
+    Registered with atexit so that buffered rows are not lost on exit.
+    """
+    for save_dir in list(_unflushed):
+        flush_row_cache(save_dir)
+
+def cache_row(row: List[Row], save_dir: str) -> ScrapeOutcome:
+    """
+    Cache a row of data. The row is buffered in memory until flush_row_cache() is called.
+
+    Parameters:
+        row (List[Row]): The row of data to cache.
+        save_dir (str): The directory where the cached rows are stored.
+
+    Returns:
+        ScrapeOutcome: CACHED if the reference number already exists in the cache, OK otherwise.
+    """
+    references, _ = _load_row_cache(save_dir)
+
+    if row[0].reference_number in references:
+        logger.warning('The reference number [%s] already exists in the cache.', row[0].reference_number)
+        return ScrapeOutcome.CACHED
+
+    buffered = _buffer.setdefault(save_dir, [])
+    buffered.extend(row)
+    references.update(cached.reference_number for cached in row)
+    _unflushed.add(save_dir)
+
+    if len(buffered) >= ROW_BUFFER_SIZE:
+        _merge_buffer(save_dir)
+
+    logger.info('Row with reference number [%s] cached successfully.', row[0].reference_number)
+    return ScrapeOutcome.OK
+
+def _load_cache_file(filename: str, save_dir: str) -> Optional[DataFrame]:
+    """
+    Load a cache file. The rows cache is served from memory.
+
+    Parameters:
+        filename (str): The name of the cache file to load.
+        save_dir (str): The directory where the cache file is located.
 
-    logger.info(f'Row with reference number [{Color.colorize(row[0].reference_number, Color.CYAN)}] cached successfully.')
+    Returns:
+        Optional[DataFrame]: The cached data, or None if there is none.
+    """
+    if filename == ROWS_CACHE_FILE:
+        return _merge_buffer(save_dir)
+
+    return load_csv_file(filename, save_dir)
 
 def remove_row_from_csv(filename: str, save_dir: str, reference_number: str) -> None:
     """
-    Removes a row from a CSV file based on the reference number.
+    Removes a row from a cache file based on the reference number.
+    For the rows cache, the row is only removed in memory and is written
+    by the next flush_row_cache() call.
 
     Parameters:
-        filename (str): The name of the CSV file to modify.
-        save_dir (str): The directory where the CSV file is located.
+        filename (str): The name of the cache file to modify.
+        save_dir (str): The directory where the cache file is located.
         reference_number (str): The reference number of the row to remove.
     """
-    if check_file(filename, 'documents', save_dir, 'cache'):
-        df = load_csv_file(filename, save_dir)
+    if filename == ROWS_CACHE_FILE:
+        references, _ = _load_row_cache(save_dir)
+        rows = _merge_buffer(save_dir)
+        if rows is not None:
+            references.discard(reference_number)
+            _ref_cache[save_dir] = (references, rows.remove(pl.col('reference_number') == reference_number))
+            _unflushed.add(save_dir)
+        return
+
+    df = load_csv_file(filename, save_dir)
+    if df is not None:
         df = df.remove(pl.col('reference_number') == reference_number)
-        df.write_csv(path.join(DOC_DIR, save_dir, 'cache', filename))
+        df.write_csv(path.join(get_cache_dir(save_dir), filename))
 
 def _check_reference_number(reference_number: str, save_dir: str) -> bool:
     """
     Check if the reference number exists in the cached rows.
-    This function reads the cached CSV file and filters the rows based on the reference number.
-
-    If the reference number is found, it returns True; otherwise, it returns False.
 
     Parameters:
         reference_number (str): The reference number to check.
@@ -74,45 +221,55 @@ def _check_reference_number(reference_number: str, save_dir: str) -> bool:
     Returns:
         bool: True if the reference number exists in the cached rows, False otherwise.
     """
-    cache_file = path.join(DOC_DIR, save_dir, 'cache', 'rows.csv')
-
-    # Check if the reference number exists in the cached rows already.
-    query = (
-        pl.scan_csv(cache_file)
-        .filter(pl.col('reference_number') == reference_number)
-    )
-
-    # Check if the query result is empty. Thus, the reference number does not exist.
-    return not query.collect().is_empty()
+    references, _ = _load_row_cache(save_dir)
+    return reference_number in references
 
 def get_reference_numbers(filename: str, save_dir: str) -> Series:
     """
     Get the reference numbers from the cached rows.
 
     Parameters:
-        filename (str): The name of the CSV file to read.
-        save_dir (str): The directory where the CSV file is located.
+        filename (str): The name of the cache file to read.
+        save_dir (str): The directory where the cache file is located.
 
     Returns:
         Series[str]: A Series containing the reference numbers.
     """
-    if check_file(filename, 'documents', save_dir, 'cache'):
-        df = load_csv_file(filename, save_dir)
+    df = _load_cache_file(filename, save_dir)
+    if df is not None:
         return df.get_column('reference_number')
 
+def get_reference_number_set(filename: str, save_dir: str) -> FrozenSet[str]:
+    """
+    Get the reference numbers from the cached rows as a set.
+    Prefer this over get_reference_numbers() for membership checks in loops.
+
+    Parameters:
+        filename (str): The name of the cache file to read.
+        save_dir (str): The directory where the cache file is located.
+
+    Returns:
+        FrozenSet[str]: The reference numbers, empty if there are no cached rows.
+    """
+    if filename == ROWS_CACHE_FILE:
+        return frozenset(_load_row_cache(save_dir)[0])
+
+    references = get_reference_numbers(filename, save_dir)
+    return frozenset(references.to_list()) if references is not None else frozenset()
+
 def check_scraped(reference_number: str, filename: str, save_dir: str) -> bool:
     """
     Check if a row has been scraped based on the reference number.
-    The function reads the cached CSV file and filters the rows based on the reference number.
+    The function reads the cache file and filters the rows based on the reference number.
 
     Parameters:
         reference_number (str): The reference number to check.
-        filename (str): The name of the CSV file to read.
-        save_dir (str): The directory where the CSV file is located.
+        filename (str): The name of the cache file to read.
+        save_dir (str): The directory where the cache file is located.
 
     Returns:
         bool: True if the row has been scraped, False otherwise.
     """
-    if check_file(filename, 'documents', save_dir, 'cache'):
-        df = load_csv_file(filename, save_dir)
+    df = _load_cache_file(filename, save_dir)
+    if df is not None:
         return df.filter(pl.col('reference_number') == reference_number).select('scraped').item()
\ No newline at end of file
@@ -1,3 +1,10 @@
+import os
+import sys
+
+# ANSI escape codes are only useful on a terminal. When the logs are
+# redirected to a file, or NO_COLOR is set, the text is left as is.
+_ENABLED = sys.stderr.isatty() and os.environ.get('NO_COLOR') is None
+
 class Color:
     """
     Custom color utility for adding ANSI escape codes to text.
@@ -14,6 +21,7 @@ class Color:
     BOLD = "\033[1m"
     RESET = "\033[0m"
 
+    @staticmethod
     def colorize(text: str, color: str) -> str:
         """
         Colorizes the text with the given color.
@@ -25,4 +33,7 @@ class Color:
         Returns:
             str: the colorized text.
         """
+        if not _ENABLED:
+            return text
+
         return f"{color}{text}{Color.RESET}"
\ No newline at end of file
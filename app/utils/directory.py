@@ -1,15 +1,94 @@
+import os
+import sys
 import time
+import errno
+import select
 import shutil
-from typing import Optional, List
-from os import path, mkdir, remove
+import struct
+import threading
+import ctypes
+import ctypes.util
+from functools import lru_cache
+from typing import Dict, Optional, List, Tuple
+from os import path, access, makedirs, replace, unlink, F_OK
 
 from app.config.logger import setup_logger
-from app.config.constants import DATA_DIR
-from app.config.constants import DRIVER_DOWNLOAD_TIMEOUT, DRIVER_DOWNLOAD_POLL_INTERVAL
-from app.utils.colors import Color
+from app.config.constants import DATA_DIR, DOC_DIR
+from app.config.constants import (
+    DRIVER_DOWNLOAD_TIMEOUT,
+    DRIVER_DOWNLOAD_POLL_INTERVAL,
+    DRIVER_DOWNLOAD_INITIAL_POLL_INTERVAL,
+    DIRECTORY_EXISTS_TTL
+)
+
+# Watchdog is optional (the "fast" extra). It lets us wait on file system
+# events (inotify on Linux, ReadDirectoryChangesW on Windows) instead of
+# polling the directory.
+try:
+    from watchdog.events import FileSystemEvent, FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+# On Linux, inotify also reports when a file is closed after being written
+# (IN_CLOSE_WRITE). That is a stronger signal than the file being created,
+# which can happen before any of its contents are written.
+_CLOSE_EVENTS = sys.platform.startswith('linux')
+
+# Without watchdog, inotify is used directly through libc on Linux.
+# Other platforms fall back to polling.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = os.O_NONBLOCK if hasattr(os, 'O_NONBLOCK') else 0
+_IN_CLOEXEC = os.O_CLOEXEC if hasattr(os, 'O_CLOEXEC') else 0
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+_libc = None
+if Observer is None and _CLOSE_EVENTS:
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _libc.inotify_init1
+    except (OSError, AttributeError):
+        _libc = None
+
+# Recent results of check_directory(), as (checked at, exists) per path.
+# Entries are dropped whenever this module creates, removes or moves a path.
+_EXISTS_CACHE: Dict[str, Tuple[float, bool]] = {}
 
 logger = setup_logger(__name__)
 
+@lru_cache(maxsize=128)
+def _data_dir(directory_name: str) -> str:
+    """
+        Gets the path of a directory inside DATA_DIR.
+        The paths are cached since the same few directories are used
+        for every download, move and existence check.
+
+        Parameters:
+            directory_name (str): the name of the directory.
+
+        Returns:
+            str: the path of the directory.
+    """
+
+    return path.join(DATA_DIR, directory_name)
+
+@lru_cache(maxsize=128)
+def get_cache_dir(directory_name: str) -> str:
+    """
+        Gets the path of the cache directory of a save directory.
+        The paths are cached since they are looked up for every cache file access.
+
+        Parameters:
+            directory_name (str): the name of the save directory.
+
+        Returns:
+            str: the path of the cache directory.
+    """
+
+    return path.join(DOC_DIR, directory_name, 'cache')
+
 def create_save_directory(directory_name: str) -> None:
     """
         Creates a directory if it does not exist.
@@ -18,19 +97,24 @@ def create_save_directory(directory_name: str) -> None:
             directory_name (str): the name of the directory.
     """
 
-    dir = path.join(DATA_DIR, 'documents', directory_name)
-    cache = path.join(dir, 'cache')
+    cache = get_cache_dir(directory_name)
+
+    # A single call creates both directories. It raises FileExistsError when
+    # they already exist (e.g. another process created them first), so no
+    # separate existence check is needed.
+    try:
+        makedirs(cache)
+        logger.info("Created directory: [%s] successfully.", directory_name)
+    except FileExistsError:
+        logger.warning("Directory: [%s] already exists.", directory_name)
 
-    if not path.exists(dir):
-        mkdir(dir)
-        mkdir(cache)
-        logger.info(f"Created directory: [{Color.colorize(directory_name, Color.CYAN)}] successfully.")
-    else:
-        logger.warning(f"Directory: [{Color.colorize(directory_name, Color.CYAN)}] already exists.")
+    _EXISTS_CACHE.pop(cache, None)
+    _EXISTS_CACHE.pop(path.dirname(cache), None)
 
 def check_directory(dir: str) -> bool:
     """
-        Checks if the directory exists.
+        Checks if the directory exists with access(F_OK). Results are
+        cached for DIRECTORY_EXISTS_TTL seconds.
 
         Parameters:
             dir (str): the name of the directory.
@@ -39,7 +123,14 @@ def check_directory(dir: str) -> bool:
             bool: True if the directory exists, False otherwise.
     """
 
-    return path.exists(dir)
+    now = time.monotonic()
+    cached = _EXISTS_CACHE.get(dir)
+    if cached is not None and now - cached[0] < DIRECTORY_EXISTS_TTL:
+        return cached[1]
+
+    exists = access(dir, F_OK)
+    _EXISTS_CACHE[dir] = (now, exists)
+    return exists
 
 def check_file(file_name: str, *directory_name: Optional[str]) -> bool:
     """
@@ -54,7 +145,7 @@ def check_file(file_name: str, *directory_name: Optional[str]) -> bool:
     """
 
     dir = path.join(DATA_DIR, *directory_name, file_name)
-    return path.exists(dir)
+    return access(dir, F_OK)
 
 def remove_directory(directory_name: str) -> None:
     """
@@ -64,9 +155,33 @@ def remove_directory(directory_name: str) -> None:
             directory_name (str): the name of the directory.
     """
 
-    dir = path.join(DATA_DIR, directory_name)
-    if path.exists(dir):
-        remove(dir)
+    dir = _data_dir(directory_name)
+    if check_directory(dir):
+        shutil.rmtree(dir, ignore_errors=True)
+    _EXISTS_CACHE.pop(dir, None)
+
+def move_file(src: str, dst: str) -> None:
+    """
+        Moves a file, overwriting the destination if it exists.
+        Within a file system this is a single rename. Across file
+        systems the file is copied (with sendfile where available)
+        and the source is removed.
+
+        Parameters:
+            src (str): the path of the file to move.
+            dst (str): the path to move the file to.
+    """
+
+    try:
+        replace(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copyfile(src, dst)
+        unlink(src)
+    finally:
+        _EXISTS_CACHE.pop(src, None)
+        _EXISTS_CACHE.pop(dst, None)
 
 def move_document(
         filename: str,
@@ -85,44 +200,244 @@ def move_document(
             rename (str): the new name of the file.
     """
 
-    src = path.join(DATA_DIR, source_directory, filename)
-    dst = path.normpath(f'{DATA_DIR}/documents/{destination_directory}/cache/{rename or filename}')
+    src = path.join(_data_dir(source_directory), filename)
+    cache = get_cache_dir(destination_directory)
+    dst = path.join(cache, rename or filename)
 
-    if not check_directory(dst):
-        logger.error(f'Directory: [{Color.colorize(destination_directory, Color.CYAN)}] does not exist.')
+    # Check the destination's directory (not the file, which does not exist
+    # yet). The result is cached, so moving many files only checks once.
+    if not check_directory(cache):
+        logger.error('Directory: [%s] does not exist.', destination_directory)
         create_save_directory(destination_directory)
 
-    shutil.move(src, dst)
-    logger.info(f"Moved file: [{Color.colorize(filename, Color.CYAN)}] to [{Color.colorize(destination_directory, Color.CYAN)}] successfully.")
+    move_file(src, dst)
+    logger.info("Moved file: [%s] to [%s] successfully.", filename, destination_directory)
 
 def wait_for_download(
     file_name: str,
     directory_name: Optional[str] = '',
     timeout: int = DRIVER_DOWNLOAD_TIMEOUT,
-    poll_interval: int = DRIVER_DOWNLOAD_POLL_INTERVAL,
+    poll_interval: float = DRIVER_DOWNLOAD_POLL_INTERVAL,
     temp_extensions: Optional[List[str]] = None
     ) -> bool:
     """
         Waits for the download to complete.
+        File system events are used when watchdog (the "fast" extra) is
+        installed, or inotify on Linux. Otherwise the directory is polled.
 
         Parameters:
             directory_name (str): the name of the directory.
             file_name (str): the name of the file.
             timeout (int): the timeout in seconds.
-            poll_interval (int): the poll interval in seconds.
+            poll_interval (float): the poll interval in seconds.
             temp_extensions (List[str]): List of temp file extensions (e.g., ['crdownload', 'tmp']).
         Returns:
             bool: True if the download is successful, False otherwise.
     """
-    start_time = time.time()
-    temp_extensions = temp_extensions or []
-    file = path.join(DATA_DIR, directory_name, file_name)
+    # A tuple lets str.endswith check every extension in a single call.
+    temp_extensions = tuple(temp_extensions or ())
+    directory = _data_dir(directory_name)
+
+    try:
+        if Observer is not None:
+            downloaded = _watch_for_download(file_name, directory, timeout, temp_extensions)
+        elif _libc is not None:
+            downloaded = _inotify_wait_for_download(file_name, directory, timeout, temp_extensions)
+        else:
+            downloaded = _poll_for_download(file_name, directory, timeout, poll_interval, temp_extensions)
+    except FileNotFoundError:
+        # A directory that does not exist yet cannot be watched. Browsers only
+        # create the download directory on the first download, so poll until
+        # the file appears instead.
+        downloaded = _poll_for_download(file_name, directory, timeout, poll_interval, temp_extensions)
+
+    if downloaded:
+        logger.info("Downloaded file [%s] successfully.", file_name)
+        return True
+
+    logger.error("Timed out. Failed to download file [%s].", file_name)
+    return False
+
+class _DownloadEventHandler(FileSystemEventHandler):
+    """
+        Sets the downloaded event once the expected file is created or
+        renamed into the watched directory.
+    """
+
+    def __init__(self, file_name: str, temp_extensions: Tuple[str, ...], downloaded: threading.Event) -> None:
+        self.file_name = file_name
+        self.temp_extensions = temp_extensions
+        self.downloaded = downloaded
+
+    def _check(self, file_path: str) -> None:
+        if path.basename(file_path) != self.file_name:
+            return
+        if not self.file_name.endswith(self.temp_extensions):
+            self.downloaded.set()
+
+    def on_created(self, event: 'FileSystemEvent') -> None:
+        if not _CLOSE_EVENTS:
+            self._check(event.src_path)
+
+    def on_closed(self, event: 'FileSystemEvent') -> None:
+        self._check(event.src_path)
+
+    def on_moved(self, event: 'FileSystemEvent') -> None:
+        # Browsers download to a temporary file and rename it when done.
+        self._check(event.dest_path)
+
+def _watch_for_download(file_name: str, directory: str, timeout: int, temp_extensions: Tuple[str, ...]) -> bool:
+    """
+        Waits for the file to appear using file system events.
+
+        Parameters:
+            file_name (str): the name of the file.
+            directory (str): the directory to watch.
+            timeout (int): the timeout in seconds.
+            temp_extensions (Tuple[str, ...]): Tuple of temp file extensions.
+
+        Returns:
+            bool: True if the file appeared before the timeout, False otherwise.
+    """
+    downloaded = threading.Event()
+    observer = Observer()
+    observer.schedule(_DownloadEventHandler(file_name, temp_extensions, downloaded), directory, recursive=False)
+    observer.start()
 
-    while time.time() - start_time < timeout:
-        if not any(file_name.endswith(ext) for ext in temp_extensions) and path.exists(file):
-            logger.info(f"Downloaded file [{Color.colorize(file_name, Color.CYAN)}] successfully.")
+    try:
+        # The download may have finished before the observer started.
+        if not file_name.endswith(temp_extensions) and access(path.join(directory, file_name), F_OK):
             return True
-        time.sleep(poll_interval)
+        return downloaded.wait(timeout)
+    finally:
+        observer.stop()
+        observer.join()
+
+def _inotify_wait_for_download(file_name: str, directory: str, timeout: int, temp_extensions: Tuple[str, ...]) -> bool:
+    """
+        Waits for the file to be written or renamed into the directory
+        using inotify directly (Linux only).
+
+        Parameters:
+            file_name (str): the name of the file.
+            directory (str): the directory to watch.
+            timeout (int): the timeout in seconds.
+            temp_extensions (Tuple[str, ...]): Tuple of temp file extensions.
+
+        Returns:
+            bool: True if the file appeared before the timeout, False otherwise.
+
+        Raises:
+            FileNotFoundError: If the directory does not exist.
+    """
+    if file_name.endswith(temp_extensions):
+        return False
+
+    fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    if fd < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+
+    try:
+        if _libc.inotify_add_watch(fd, os.fsencode(directory), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            # Raised as FileNotFoundError (ENOENT) if the directory does not exist yet.
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), directory)
+
+        # The download may have finished before the watch was added.
+        if access(path.join(directory, file_name), F_OK):
+            return True
+
+        name = os.fsencode(file_name)
+        deadline = time.monotonic() + timeout
+
+        while (remaining := deadline - time.monotonic()) > 0:
+            if not select.select([fd], [], [], remaining)[0]:
+                break
+
+            try:
+                buffer = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+
+            offset = 0
+            while offset < len(buffer):
+                _, _, _, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+                offset += _INOTIFY_EVENT.size
+                if buffer[offset:offset + length].rstrip(b'\0') == name:
+                    return True
+                offset += length
+
+        return False
+    finally:
+        os.close(fd)
+
+def _download_complete(file_name: str, directory: str, temp_extensions: Tuple[str, ...]) -> bool:
+    """
+        Checks if the file is in the directory and no temporary file of
+        this download is left next to it. A single directory scan answers
+        both. Only the file's own temp names ("<file_name>.crdownload") and
+        Chrome's "Unconfirmed *.crdownload" names are checked, so a temp
+        file left behind by an earlier download does not block this one.
+
+        Parameters:
+            file_name (str): the name of the file.
+            directory (str): the directory to check.
+            temp_extensions (Tuple[str, ...]): Tuple of temp file extensions.
+
+        Returns:
+            bool: True if the download is complete, False otherwise.
+    """
+
+    found = False
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.endswith(temp_extensions) and (
+                    name.startswith(file_name) or name.startswith('Unconfirmed ')
+                ):
+                    return False
+                if entry.name == file_name:
+                    found = True
+    except FileNotFoundError:
+        return False
+
+    return found
+
+def _poll_for_download(file_name: str, directory: str, timeout: int,
+                       poll_interval: float, temp_extensions: Tuple[str, ...]) -> bool:
+    """
+        Waits for the file to appear by polling the directory, until no
+        temporary download files are left. The interval between checks
+        starts short and backs off exponentially up to poll_interval.
+
+        Parameters:
+            file_name (str): the name of the file.
+            directory (str): the directory to poll.
+            timeout (int): the timeout in seconds.
+            poll_interval (float): the poll interval in seconds.
+            temp_extensions (Tuple[str, ...]): Tuple of temp file extensions.
+
+        Returns:
+            bool: True if the file appeared before the timeout, False otherwise.
+    """
+    if file_name.endswith(temp_extensions):
+        return False
+
+    # Bind the functions used in the loop to local names.
+    monotonic, sleep, complete = time.monotonic, time.sleep, _download_complete
+
+    deadline = monotonic() + timeout
+    interval = min(DRIVER_DOWNLOAD_INITIAL_POLL_INTERVAL, poll_interval)
+
+    # Check right away, since the download may already be done.
+    while not complete(file_name, directory, temp_extensions):
+        remaining = deadline - monotonic()
+        if remaining <= 0:
+            return False
+
+        sleep(min(interval, remaining))
+        interval = min(interval * 1.5, poll_interval)
 
-    logger.error(f"Timed out. Failed to download file [{Color.colorize(file_name, Color.CYAN)}].")
-    return False
\ No newline at end of file
+    return True
\ No newline at end of file